@@ -1,60 +1,337 @@
 import streamlit as st
-import PyPDF2
+import pypdfium2 as pdfium
+import asyncio
+import hashlib
 import json
+import multiprocessing
+import os
 import re
-from io import BytesIO
+import tempfile
+import threading
+import time
+from collections import Counter
+from itertools import repeat
 from secret import GEMINI_API_KEY
+import diskcache
 import google.generativeai as genai
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from google.api_core.exceptions import ResourceExhausted
+from concurrent.futures import ProcessPoolExecutor
+from google.api_core.exceptions import GoogleAPIError, ResourceExhausted
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+from pdf_worker import extract_page_range
+from rank_bm25 import BM25Okapi
 
 # ✅ Configure Gemini API key
 genai.configure(api_key=GEMINI_API_KEY)
 
-# ====== CONFIG ======
-MAX_CHARS_PER_CHUNK = 20000  # Safe chunk size for Gemini-2.0-flash-lite
+# ✅ Gemini models, built once per process and shared across reruns and sessions
+@st.cache_resource
+def get_flash_lite_model():
+    return genai.GenerativeModel("gemini-2.0-flash-lite")
+
+@st.cache_resource
+def get_flash_model():
+    return genai.GenerativeModel("gemini-2.0-flash")
 
-# ✅ Extract text from PDF
-def extract_pdf_text(uploaded_file):
+# ====== CONFIG ======
+CHUNK_TARGET_TOKENS = 200_000  # Input tokens per chunk; Gemini-2.0-flash-lite accepts ~1M
+FALLBACK_CHARS_PER_TOKEN = 4  # Used when the token counter is unavailable
+CONTEXT_BUDGET = 800_000  # Documents up to this many tokens skip chunking and go straight to the decision
+TOP_K_CHUNKS = 5  # Most query-relevant chunks sent to Gemini when a document needs chunking
+PARALLEL_EXTRACT_MIN_PAGES = 100  # Smaller docs are extracted in-process; PDFium beats pool start-up on them
+PAGES_PER_WORKER = 16  # Pages handed to each extraction task
+MAX_CONCURRENT_REQUESTS = 4  # Gemini calls allowed in flight at once
+REQUESTS_PER_MINUTE = 30  # Gemini-2.0-flash-lite RPM quota
+MAX_RETRIES = 5  # Attempts per Gemini call before giving up on a 429
+DAILY_TOKEN_BUDGET = 5_000_000  # Gemini tokens (input + output) the app may spend per day across all sessions
+BOILERPLATE_PAGE_RATIO = 0.8  # Lines found on at least this share of pages are treated as headers/footers
+FINDINGS_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")  # On-disk store for chunk findings, shared across sessions and restarts
+FINDINGS_TTL_SECONDS = 3600  # How long cached chunk findings stay valid
+
+# ✅ Structured output schema for the final decision (Gemini returns valid JSON matching it)
+DECISION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "decision": {"type": "STRING", "format": "enum", "enum": ["approved", "rejected"]},
+        "amount": {"type": "NUMBER", "nullable": True},
+        "justification": {"type": "STRING"}
+    },
+    "required": ["decision", "amount", "justification"]
+}
+JUSTIFICATION_START = re.compile(r'"justification"\s*:\s*"')
+
+# ✅ Token bucket that paces Gemini calls to the RPM quota
+class RateLimiter:
+    def __init__(self, requests_per_minute):
+        self.capacity = requests_per_minute
+        self.tokens = float(requests_per_minute)
+        self.refill_rate = requests_per_minute / 60.0  # tokens per second
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    async def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.refill_rate
+            await asyncio.sleep(wait)
+
+# ✅ Concurrency gate that backs off on 429s (AIMD: halve on throttle, creep back up on success)
+class ConcurrencyLimiter:
+    def __init__(self, max_limit):
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        # Only used from the shared Gemini event loop (see get_event_loop), so an asyncio primitive is safe
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < max(1, int(self.limit)))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_throttle(self):
+        self.limit = max(1.0, self.limit / 2)
+
+class TokenBudgetExceeded(Exception):
+    pass
+
+# ✅ Process-wide token budget: pre-charge the estimate before a call, settle to actual usage after
+class TokenBudget:
+    def __init__(self, limit, window_seconds=24 * 60 * 60):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.used = 0
+        self.window_start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _roll_window(self):
+        if time.monotonic() - self.window_start >= self.window_seconds:
+            self.used = 0
+            self.window_start = time.monotonic()
+
+    def remaining(self):
+        with self.lock:
+            self._roll_window()
+            return self.limit - self.used
+
+    def reserve(self, tokens):
+        with self.lock:
+            self._roll_window()
+            if self.used + tokens > self.limit:
+                raise TokenBudgetExceeded(
+                    f"Token budget exhausted: {tokens:,} more tokens needed, {self.limit - self.used:,} left today."
+                )
+            self.used += tokens
+
+    def settle(self, reserved, actual):
+        with self.lock:
+            self.used = max(0, self.used + actual - reserved)
+
+# ✅ Admission control shared by every session (Streamlit re-runs this script, so keep them in the resource cache)
+@st.cache_resource
+def get_concurrency_limiter():
+    return ConcurrencyLimiter(MAX_CONCURRENT_REQUESTS)
+
+@st.cache_resource
+def get_rate_limiter():
+    return RateLimiter(REQUESTS_PER_MINUTE)
+
+@st.cache_resource
+def get_token_budget():
+    return TokenBudget(DAILY_TOKEN_BUDGET)
+
+# ✅ Chunk findings shared across sessions and restarts (keyed on model + query + chunk)
+@st.cache_resource
+def get_findings_cache():
+    return diskcache.Cache(FINDINGS_CACHE_DIR)
+
+# ✅ One long-lived event loop for every async Gemini call in the process
+# google-generativeai keeps a single default async client per process, bound to the loop that first uses it,
+# so each analysis is submitted to this loop instead of starting its own with asyncio.run.
+@st.cache_resource
+def get_event_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="gemini-event-loop", daemon=True).start()
+    return loop
+
+# ✅ Shared objects the async chunk pipeline uses, looked up on the script thread
+# (the event-loop thread has no script run context for st.cache_resource)
+class AnalysisResources:
+    def __init__(self, chars_per_token):
+        self.chars_per_token = chars_per_token  # Document's ratio, for local token estimates of chunk prompts
+        self.model = get_flash_lite_model()
+        self.findings_cache = get_findings_cache()
+        self.token_budget = get_token_budget()
+        self.concurrency_limiter = get_concurrency_limiter()
+        self.rate_limiter = get_rate_limiter()
+
+# ✅ Extract text from PDF, one string per page (cached per uploaded file)
+# Takes the upload's zero-copy buffer, hashed in place for the cache key. It is spooled to a temp
+# file once so PDFium and the worker processes read it from disk instead of each getting a pickled copy.
+@st.cache_data(show_spinner=False, hash_funcs={memoryview: lambda buf: hashlib.blake2b(buf).digest()})
+def extract_pdf_text(data):
+    path = None
     try:
-        pdf_reader = PyPDF2.PdfReader(BytesIO(uploaded_file.read()))
-        text = ""
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-        return text.strip()
-    except Exception as e:
-        st.error(f"Error reading PDF: {str(e)}")
-        return ""
-
-# ✅ Chunk text into safe pieces for LLM
-def chunk_text(text, max_chars=MAX_CHARS_PER_CHUNK):
-    words = text.split()
-    chunks, current_chunk = [], ""
-    for word in words:
-        if len(current_chunk) + len(word) + 1 <= max_chars:
-            current_chunk += (" " if current_chunk else "") + word
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp.write(data)
+            path = tmp.name
+
+        pdf = pdfium.PdfDocument(path)
+        try:
+            n_pages = len(pdf)
+        finally:
+            pdf.close()
+
+        if n_pages < PARALLEL_EXTRACT_MIN_PAGES:
+            page_texts = extract_page_range(path, 0, n_pages)
         else:
-            chunks.append(current_chunk)
-            current_chunk = word
-    if current_chunk:
-        chunks.append(current_chunk)
+            # ⚡ Extract page ranges across CPU cores
+            # Spawn rather than fork: forking the threaded Streamlit/gRPC server can deadlock the children
+            starts = range(0, n_pages, PAGES_PER_WORKER)
+            stops = [min(start + PAGES_PER_WORKER, n_pages) for start in starts]
+            with ProcessPoolExecutor(
+                max_workers=min(os.cpu_count() or 1, len(starts)),
+                mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                page_texts = [
+                    text
+                    for texts in executor.map(extract_page_range, repeat(path), starts, stops)
+                    for text in texts
+                ]
+
+        # Errors propagate (not cached) so a transient failure isn't remembered as "no text" for this upload
+        return [text.strip() for text in page_texts if text and text.strip()]
+    finally:
+        if path is not None:
+            os.remove(path)
+
+# ✅ Drop header/footer lines that repeat on most pages
+@st.cache_data(show_spinner=False)
+def strip_boilerplate(pages, min_ratio=BOILERPLATE_PAGE_RATIO):
+    if len(pages) < 3:
+        return pages
+    line_counts = Counter()
+    for page in pages:
+        line_counts.update({line.strip() for line in page.splitlines() if line.strip()})
+    min_pages = min_ratio * len(pages)
+    boilerplate = {line for line, count in line_counts.items() if count >= min_pages}
+    if not boilerplate:
+        return pages
+    stripped = []
+    for page in pages:
+        text = "\n".join(line for line in page.splitlines() if line.strip() not in boilerplate).strip()
+        if text:
+            stripped.append(text)
+    # Every line repeating (e.g. a form reprinted on each page) means it *is* the content: keep it
+    return stripped or pages
+
+# ✅ Count tokens the way Gemini will (one API call per distinct text)
+@st.cache_data(show_spinner=False)
+def count_tokens(text):
+    return get_flash_lite_model().count_tokens(text).total_tokens
+
+# ✅ Token count with a chars-based estimate when the counter is unavailable
+def estimate_tokens(text):
+    try:
+        return count_tokens(text)
+    except GoogleAPIError:
+        return len(text) // FALLBACK_CHARS_PER_TOKEN
+
+# ✅ Characters per token for a text, from its (cached) token count
+def chars_per_token(text):
+    return len(text) / max(1, estimate_tokens(text))
+
+# ✅ Group whole pages into chunks of up to max_tokens so clauses are not cut mid-page
+@st.cache_data(show_spinner=False)
+def chunk_pages(pages, max_tokens=CHUNK_TARGET_TOKENS):
+    # Count the whole document once and pack pages by its chars-per-token ratio,
+    # rather than paying a count_tokens round-trip for every page added
+    max_chars = max(1, int(max_tokens * chars_per_token("\n".join(pages))))
+
+    # Collect each chunk's pieces in a list and join once, rather than growing a string per page
+    chunks, current_parts, current_len = [], [], 0
+    for page in pages:
+        # Only split a page when it is too large to fit in a chunk on its own
+        pieces = [page[i:i + max_chars] for i in range(0, len(page), max_chars)]
+        for piece in pieces:
+            if current_parts and current_len + len(piece) + 1 > max_chars:
+                chunks.append("\n".join(current_parts))
+                current_parts, current_len = [], 0
+            current_len += len(piece) + (1 if current_parts else 0)
+            current_parts.append(piece)
+    if current_parts:
+        chunks.append("\n".join(current_parts))
     return chunks
 
-# ✅ Extract JSON from LLM response
-def extract_json_from_text(text):
-    try:
-        match = re.search(r"\{[\s\S]*\}", text)
-        if match:
-            return json.loads(match.group(0))
-        else:
-            raise ValueError("No JSON object found.")
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Invalid JSON: {e}")
+# ✅ Fingerprint a chunk (whitespace-insensitive) so duplicate chunks are analyzed once
+def chunk_key(chunk):
+    normalized = " ".join(chunk.split()).encode("utf-8")
+    return hashlib.blake2b(normalized, digest_size=16).digest()
+
+# ✅ Key for a chunk's cached findings: model + query + chunk (+ its position, which the prompt mentions)
+def findings_cache_key(model_name, query, chunk_text, chunk_index, total_chunks):
+    return (model_name, chunk_key(query), chunk_key(chunk_text), chunk_index, total_chunks)
+
+# ✅ Keep only the top_k chunks (by BM25 score against the query), in document order
+def select_relevant_chunks(query, chunks, indices, top_k=TOP_K_CHUNKS):
+    lowered = {idx: chunks[idx].lower() for idx in indices}
+
+    # Skip chunks that contain none of the query's words (4+ letters) before spending an LLM call on them,
+    # unless that would leave nothing to analyze
+    terms = set(re.findall(r"\w{4,}", query.lower()))
+    matching = [idx for idx in indices if any(term in lowered[idx] for term in terms)]
+    if matching:
+        indices = matching
+
+    if len(indices) <= top_k:
+        return list(indices)
+    bm25 = BM25Okapi([re.findall(r"\w+", lowered[idx]) for idx in indices])
+    scores = bm25.get_scores(re.findall(r"\w+", query.lower()))
+    ranked = sorted(range(len(indices)), key=lambda i: scores[i], reverse=True)[:top_k]
+    return sorted(indices[i] for i in ranked)
+
+# ✅ Call Gemini under admission control, retrying 429s with exponential backoff + jitter
+@retry(
+    stop=stop_after_attempt(MAX_RETRIES),
+    wait=wait_exponential_jitter(initial=1, max=30),
+    retry=retry_if_exception_type(ResourceExhausted),
+    reraise=True
+)
+async def generate_content_throttled(resources, prompt, generation_config):
+    limiter = resources.concurrency_limiter
+    async with limiter:
+        await resources.rate_limiter.acquire()
+        try:
+            response = await resources.model.generate_content_async(prompt, generation_config=generation_config)
+        except ResourceExhausted:
+            limiter.on_throttle()
+            raise
+    limiter.on_success()
+    return response
+
+# ✅ Ask Gemini for partial analysis of a chunk (cached per query + chunk)
+async def summarize_chunk(resources, query, chunk_text, chunk_index, total_chunks):
+    model = resources.model
+    cache = resources.findings_cache
+    cache_key = findings_cache_key(model.model_name, query, chunk_text, chunk_index, total_chunks)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
 
-# ✅ Ask Gemini for partial analysis of a chunk
-def analyze_chunk(query, chunk_text, chunk_index, total_chunks):
     prompt = f"""
 You are an AI insurance analyst.
 
@@ -70,9 +347,14 @@ Your task for this part:
 - Summarize key findings for this chunk only.
 Return findings as plain text.
 """
-    model = genai.GenerativeModel("gemini-2.0-flash-lite")
+    # Estimate locally from the document's chars-per-token ratio rather than spend a count_tokens call
+    budget = resources.token_budget
+    estimate = int(len(prompt) / resources.chars_per_token)
+    budget.reserve(estimate)
+    used = 0  # Nothing is charged if no response ever comes back
     try:
-        response = model.generate_content(
+        response = await generate_content_throttled(
+            resources,
             prompt,
             generation_config={
                 "temperature": 0.0,
@@ -80,19 +362,47 @@ Return findings as plain text.
                 "top_k": 1
             }
         )
-        return f"--- Findings from Part {chunk_index+1} ---\n{response.text.strip()}"
+        used = response.usage_metadata.total_token_count
+    finally:
+        budget.settle(estimate, used)
+    findings = response.text.strip()
+    cache.set(cache_key, findings, expire=FINDINGS_TTL_SECONDS)
+    return findings
+
+# ✅ Label chunk findings; quota errors that outlast the retries are raised before caching so they are never stored
+async def analyze_chunk(resources, query, chunk_text, chunk_index, total_chunks):
+    try:
+        findings = await summarize_chunk(resources, query, chunk_text, chunk_index, total_chunks)
+        return f"--- Findings from Part {chunk_index+1} ---\n{findings}"
     except ResourceExhausted:
         return f"--- Findings from Part {chunk_index+1} ---\n⚠️ Quota exceeded for this request."
 
-# ✅ Final decision making after merging chunk summaries
-def ask_llm(query, merged_summary):
+# ✅ Analyze the selected chunks concurrently on the shared event loop
+async def analyze_chunks(resources, query, chunks, indices):
+    tasks = [asyncio.create_task(analyze_chunk(resources, query, chunks[idx], idx, len(chunks))) for idx in indices]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        # The loop outlives this analysis, so stop the remaining calls instead of letting them spend quota
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+# ✅ Run the chunk analysis on the shared event loop and wait for the findings
+def run_chunk_analysis(query, chunks, indices, chars_per_token):
+    coro = analyze_chunks(AnalysisResources(chars_per_token), query, chunks, indices)
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+# ✅ Final decision making after merging chunk summaries (streamed token by token)
+def ask_llm(query, merged_summary, context_title="Summarized Relevant Policy Information"):
     prompt = f"""
 You are an AI insurance analyst.
 
 User Query:
 {query}
 
-Summarized Relevant Policy Information:
+{context_title}:
 {merged_summary}
 
 Your task:
@@ -100,49 +410,74 @@ Your task:
 2. Specify the claim amount (if applicable).
 3. Justify the decision.
 
-Return ONLY a JSON response in the following format (no markdown, no explanation):
-
-{{
-  "decision": "approved or rejected",
-  "amount": "amount in INR or null",
-  "justification": "your reasoning"
-}}
+Return a JSON object with:
+- "decision": "approved" or "rejected"
+- "amount": amount payable in INR, or null
+- "justification": your reasoning
 """
-    model = genai.GenerativeModel("gemini-2.0-flash")
-    response = model.generate_content(
-        prompt,
-        generation_config={
-            "temperature": 0.0,
-            "top_p": 1.0,
-            "top_k": 1
-        }
-    )
-    return response.text.strip()
-
-# ✅ Main UI
-def main():
-    st.set_page_config(page_title="Insurance Claim Analyzer", page_icon="📄", layout="wide")
-
-    with st.sidebar:
-        st.image("https://cdn-icons-png.flaticon.com/512/3050/3050525.png", width=100)
-        st.title("Claim Analyzer")
-        st.markdown("**🔐 AI-powered system to verify insurance claims.**")
-        st.info("Upload your insurance policy and describe your claim in simple terms.")
-        st.caption("Built with Streamlit • Gemini • PyPDF2")
-
-    st.markdown("<h2 style='color:#004080'>📑 Insurance Claim Analyzer</h2>", unsafe_allow_html=True)
-    st.markdown("Use this tool to **automatically verify claims** based on uploaded insurance documents.")
-
-    with st.expander("🧭 How to Use", expanded=False):
-        st.markdown("""
-        1. Upload an **insurance policy** PDF 📄  
-        2. Enter your claim as a **natural language description** 💬  
-        3. Click **Analyze** to get:  
-            - ✅ Decision (Approved or Rejected)  
-            - 💰 Estimated Amount  
-            - 🧠 Explanation from Gemini
-        """)
-
+    model = get_flash_model()
+    budget = get_token_budget()
+    # The context's token count is usually cached already (the fast path just counted the whole document)
+    estimate = estimate_tokens(merged_summary) + (len(prompt) - len(merged_summary)) // FALLBACK_CHARS_PER_TOKEN
+    budget.reserve(estimate)
+    used = 0  # Nothing is charged if the request fails outright
+    try:
+        response = model.generate_content(
+            prompt,
+            stream=True,
+            generation_config={
+                "temperature": 0.0,
+                "top_p": 1.0,
+                "top_k": 1,
+                "response_mime_type": "application/json",
+                "response_schema": DECISION_SCHEMA
+            }
+        )
+        used = estimate
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+        used = response.usage_metadata.total_token_count
+    finally:
+        budget.settle(estimate, used)
+
+# ✅ Decode as much of a JSON string value as has arrived (text[start] is just past its opening quote)
+def partial_json_string(text, start):
+    end = start
+    while end < len(text) and text[end] != '"':
+        if text[end] == "\\":
+            # Stop before an escape sequence that hasn't fully arrived yet
+            step = 6 if text[end + 1:end + 2] == "u" else 2
+            if end + step > len(text):
+                break
+            end += step
+        else:
+            end += 1
+    return json.loads('"' + text[start:end] + '"', strict=False)
+
+# ✅ Yield only the justification text from the streamed decision JSON; raw_parts collects the full response
+def stream_justification(decision_stream, raw_parts):
+    raw, value_start, shown = "", None, 0
+    for piece in decision_stream:
+        raw_parts.append(piece)
+        raw += piece
+        if value_start is None:
+            match = JUSTIFICATION_START.search(raw)
+            if match is None:
+                continue
+            value_start = match.end()
+        text = partial_json_string(raw, value_start)
+        if len(text) > shown:
+            yield text[shown:]
+            shown = len(text)
+
+# ✅ Final decision straight from the full policy text (fast path for documents that fit in one request)
+def ask_llm_direct(query, doc_text):
+    yield from ask_llm(query, doc_text, context_title="Policy Document")
+
+# ✅ Upload, claim input and results; reruns on its own so typing doesn't redraw the page scaffolding
+@st.fragment
+def analysis_panel():
     uploaded_file = st.file_uploader("📤 Upload Insurance Policy PDF", type="pdf")
 
     query = st.text_area(
@@ -153,33 +488,84 @@ def main():
 
     if uploaded_file and query:
         with st.spinner("📚 Extracting policy content..."):
-            doc_text = extract_pdf_text(uploaded_file)
+            try:
+                pages = extract_pdf_text(uploaded_file.getbuffer())
+            except Exception as e:
+                st.error(f"Error reading PDF: {str(e)}")
+                return
 
-        if not doc_text:
+        if not pages:
             st.error("❌ No readable text found in the uploaded document.")
             return
 
         if st.button("🚀 Analyze Claim Now"):
-            with st.spinner("🔍 Splitting and analyzing document..."):
-                chunks = chunk_text(doc_text)
-                st.info(f"Document split into {len(chunks)} chunk(s) for analysis.")
-
-                # ⚡ Run chunk analysis in parallel
-                partial_findings = []
-                with ThreadPoolExecutor() as executor:
-                    futures = [executor.submit(analyze_chunk, query, chunk, idx, len(chunks)) for idx, chunk in enumerate(chunks)]
-                    for future in as_completed(futures):
-                        partial_findings.append(future.result())
+            policy_pages = strip_boilerplate(pages)
+            doc_text = "\n".join(policy_pages)
 
-                # Preserve order
-                partial_findings.sort(key=lambda x: int(re.search(r"Part (\d+)", x).group(1)))
-
-                merged_summary = "\n\n".join(partial_findings)
+            with st.spinner("🔍 Splitting and analyzing document..."):
+                # 🚀 Fast path: the whole policy fits in one request, so skip the chunk map-reduce
+                if estimate_tokens(doc_text) <= CONTEXT_BUDGET:
+                    st.info("Document fits in a single request; analyzing it in one pass.")
+                    decision_stream = ask_llm_direct(query, doc_text)
+                else:
+                    chunks = chunk_pages(policy_pages)
+                    st.info(f"Document split into {len(chunks)} chunk(s) for analysis.")
+
+                    # 🧬 Send each distinct chunk once; repeats point back to the first copy
+                    keys = [chunk_key(chunk) for chunk in chunks]
+                    first_seen = {}
+                    for idx, key in enumerate(keys):
+                        first_seen.setdefault(key, idx)
+
+                    # 🎯 Only analyze the chunks most relevant to the claim
+                    selected = select_relevant_chunks(query, chunks, list(first_seen.values()))
+                    if len(selected) < len(first_seen):
+                        st.info(f"Analyzing the {len(selected)} most relevant chunk(s).")
+
+                    # 💸 Don't fan out requests the token budget can't cover (cached findings cost nothing)
+                    doc_chars_per_token = chars_per_token(doc_text)
+                    findings_cache = get_findings_cache()
+                    model_name = get_flash_lite_model().model_name
+                    uncached_chars = sum(
+                        len(chunks[idx])
+                        for idx in selected
+                        if findings_cache_key(model_name, query, chunks[idx], idx, len(chunks)) not in findings_cache
+                    )
+                    needed_tokens = int(uncached_chars / doc_chars_per_token)
+                    remaining_tokens = get_token_budget().remaining()
+                    if needed_tokens > remaining_tokens:
+                        st.error(f"❌ Token budget exhausted: about {needed_tokens:,} tokens needed, {remaining_tokens:,} left today.")
+                        return
+
+                    # ⚡ Run chunk analysis concurrently, writing each result to its chunk's slot to preserve order
+                    partial_findings = [None] * len(chunks)
+                    try:
+                        results = run_chunk_analysis(query, chunks, selected, doc_chars_per_token)
+                    except TokenBudgetExceeded as e:
+                        st.error(f"❌ {e}")
+                        return
+                    for idx, findings in zip(selected, results):
+                        partial_findings[idx] = findings
+
+                    for idx, key in enumerate(keys):
+                        first = first_seen[key]
+                        if idx != first and partial_findings[first] is not None:
+                            partial_findings[idx] = f"--- Findings from Part {idx+1} ---\nSame content as Part {first+1}."
+
+                    merged_summary = "\n\n".join(findings for findings in partial_findings if findings is not None)
+                    decision_stream = ask_llm(query, merged_summary)
 
             with st.spinner("🤖 Making final decision with Gemini..."):
                 try:
-                    raw = ask_llm(query, merged_summary)
-                    result = extract_json_from_text(raw)
+                    # 📡 Show the justification live while it streams, then replace it with the parsed result
+                    live_output = st.empty()
+                    raw_parts = []
+                    with live_output.container():
+                        st.markdown("#### 🧠 Justification")
+                        st.write_stream(stream_justification(decision_stream, raw_parts))
+                    live_output.empty()
+                    raw = "".join(raw_parts)
+                    result = json.loads(raw)
 
                     st.success("✅ Claim Analysis Complete")
                     st.markdown("### 📊 Result Summary")
@@ -204,6 +590,8 @@ def main():
                     with st.expander("📦 Full Gemini JSON Output"):
                         st.json(result)
 
+                except TokenBudgetExceeded as e:
+                    st.error(f"❌ {e}")
                 except Exception as e:
                     st.error("⚠️ Error processing Gemini response")
                     st.text(raw if 'raw' in locals() else "No response received.")
@@ -211,5 +599,31 @@ def main():
     else:
         st.warning("📥 Please upload a PDF and describe your claim to start.")
 
+# ✅ Main UI
+def main():
+    st.set_page_config(page_title="Insurance Claim Analyzer", page_icon="📄", layout="wide")
+
+    with st.sidebar:
+        st.image("https://cdn-icons-png.flaticon.com/512/3050/3050525.png", width=100)
+        st.title("Claim Analyzer")
+        st.markdown("**🔐 AI-powered system to verify insurance claims.**")
+        st.info("Upload your insurance policy and describe your claim in simple terms.")
+        st.caption("Built with Streamlit • Gemini • pypdfium2")
+
+    st.markdown("<h2 style='color:#004080'>📑 Insurance Claim Analyzer</h2>", unsafe_allow_html=True)
+    st.markdown("Use this tool to **automatically verify claims** based on uploaded insurance documents.")
+
+    with st.expander("🧭 How to Use", expanded=False):
+        st.markdown("""
+        1. Upload an **insurance policy** PDF 📄  
+        2. Enter your claim as a **natural language description** 💬  
+        3. Click **Analyze** to get:  
+            - ✅ Decision (Approved or Rejected)  
+            - 💰 Estimated Amount  
+            - 🧠 Explanation from Gemini
+        """)
+
+    analysis_panel()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,19 @@
+import pypdfium2 as pdfium
+
+# ✅ Extract text for pages [start, stop) of the PDF at path
+# Lives outside app.py so process-pool workers can import it without re-running the Streamlit script.
+# Each call opens its own document: PDFium handles are not safe to share across processes.
+def extract_page_range(path, start, stop):
+    pdf = pdfium.PdfDocument(path)
+    try:
+        texts = []
+        for i in range(start, stop):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            texts.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+        return texts
+    finally:
+        # Release PDFium's native buffers
+        pdf.close()
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+
+import diskcache
+import pytest
+
+import app
+
+
+class FakeUsage:
+    total_token_count = 10
+
+
+class FakeResponse:
+    text = "findings"
+    usage_metadata = FakeUsage()
+
+
+# Stands in for GenerativeModel. Like google-generativeai's shared async client,
+# it only works from the first event loop that uses it.
+class LoopBoundModel:
+    model_name = "models/gemini-2.0-flash-lite"
+
+    def __init__(self):
+        self.loop = None
+        self.calls = 0
+
+    def _check_loop(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        assert loop is self.loop, "attached to a different loop"
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self._check_loop()
+        self.calls += 1
+        return FakeResponse()
+
+
+# Fails Part 1 straight away; every other part waits until it is cancelled.
+class FailingModel:
+    model_name = "models/gemini-2.0-flash-lite"
+
+    def __init__(self):
+        self.cancelled = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        if "(Part 1 of" in prompt:
+            raise ValueError("boom")
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return FakeResponse()
+
+
+@pytest.fixture
+def shared_resources(tmp_path, monkeypatch):
+    # st.cache_resource doesn't memoize outside a running Streamlit server,
+    # so pin the shared resources to single instances the way the server would
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+    findings_cache = diskcache.Cache(str(tmp_path))
+    limiter = app.ConcurrencyLimiter(app.MAX_CONCURRENT_REQUESTS)
+    rate_limiter = app.RateLimiter(app.REQUESTS_PER_MINUTE)
+    budget = app.TokenBudget(app.DAILY_TOKEN_BUDGET)
+    monkeypatch.setattr(app, "get_event_loop", lambda: loop)
+    monkeypatch.setattr(app, "get_findings_cache", lambda: findings_cache)
+    monkeypatch.setattr(app, "get_concurrency_limiter", lambda: limiter)
+    monkeypatch.setattr(app, "get_rate_limiter", lambda: rate_limiter)
+    monkeypatch.setattr(app, "get_token_budget", lambda: budget)
+    try:
+        yield loop
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+        loop.close()
+        findings_cache.close()
+
+
+def test_back_to_back_chunk_analyses_share_one_event_loop(shared_resources, monkeypatch):
+    model = LoopBoundModel()
+    monkeypatch.setattr(app, "get_flash_lite_model", lambda: model)
+
+    chunks = ["knee surgery is covered", "pre-existing conditions are excluded"]
+    first = app.run_chunk_analysis("knee surgery claim", chunks, [0, 1], chars_per_token=4)
+    second = app.run_chunk_analysis("hip replacement claim", chunks, [0, 1], chars_per_token=4)
+
+    assert first == second == [
+        "--- Findings from Part 1 ---\nfindings",
+        "--- Findings from Part 2 ---\nfindings",
+    ]
+    assert model.calls == 4
+    assert model.loop is shared_resources
+
+
+def test_failed_chunk_cancels_the_rest_and_refunds_their_budget(shared_resources, monkeypatch):
+    model = FailingModel()
+    monkeypatch.setattr(app, "get_flash_lite_model", lambda: model)
+
+    chunks = ["knee surgery is covered", "pre-existing conditions are excluded", "room rent limits"]
+    with pytest.raises(ValueError, match="boom"):
+        app.run_chunk_analysis("knee surgery claim", chunks, [0, 1, 2], chars_per_token=4)
+
+    assert model.cancelled == 2
+    assert app.get_token_budget().remaining() == app.DAILY_TOKEN_BUDGET
+
+
+def test_strip_boilerplate_removes_repeated_headers():
+    pages = ["ACME Insurance\nclause 1", "ACME Insurance\nclause 2", "ACME Insurance\nclause 3"]
+    assert app.strip_boilerplate(pages) == ["clause 1", "clause 2", "clause 3"]
+
+
+def test_strip_boilerplate_keeps_pages_that_are_all_repeated():
+    assert app.strip_boilerplate(["same"] * 5) == ["same"] * 5
+
+
+def test_stream_justification_yields_only_the_decoded_justification():
+    response = '{"decision": "approved", "amount": 50000, "justification": "Knee surgery is \\"covered\\"\\nafter 30 days \\u20b9."}'
+    # Split at every character so escapes and the key itself arrive in pieces
+    raw_parts = []
+    streamed = "".join(app.stream_justification(iter(response), raw_parts))
+
+    assert streamed == 'Knee surgery is "covered"\nafter 30 days \u20b9.'
+    assert "".join(raw_parts) == response